@@ -43,7 +43,7 @@ options:
         required: true
     feature:
         description:
-            - The device feature to be learned from the device
+            - The device feature to be learned from the device. A list of features may be given to learn them all over a single connection.
         required: true
     compare_to:
         description:
@@ -78,6 +78,17 @@ EXAMPLES = """
     password: password1234
     os: iosxe
     feature: bgp
+
+# Learn several features over one connection
+- name: Learn BGP and OSPF Features
+  learn_genie:
+    host: 10.1.1.1
+    username: admin
+    password: password1234
+    os: iosxe
+    feature:
+      - bgp
+      - ospf
 """
 
 RETURN = """
@@ -87,8 +98,16 @@ feature_data:
     returned: always
 """
 
+import io
+import os
 import json
+import pickle
+import logging
+import tempfile
+import functools
+import contextlib
 import importlib
+from importlib import import_module
 from pathlib import Path
 from ansible.module_utils.basic import AnsibleModule
 from ansible.errors import AnsibleError
@@ -112,27 +131,227 @@ if not HAS_GENIE:
 try:
     from colorama import Fore, Back, Style, init
     init()
+    HAS_COLORAMA = True
 except ImportError:  # fallback so that the imported classes always exist
     class ColorFallback():
         __getattr__ = lambda self, name: ''
     Fore = Back = Style = ColorFallback()
+    HAS_COLORAMA = False
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # fall back to the standard library parser
+    def _json_loads(data):
+        # json.loads only accepts bytes from Python 3.6 on
+        return json.loads(data.decode("utf-8"))
+
+
+# Diff line prefix -> color. Headers are matched on the first three
+# characters, then +/- lines on the first character.
+HEADERS = {'+++': Fore.WHITE, '---': Fore.WHITE, '@@ ': Fore.BLUE}
+SIGNS = {'+': Fore.GREEN, '-': Fore.RED}
+RESET = Fore.RESET
+
+
+if HAS_COLORAMA:
+    def color_diff(diff):
+        # Lines keep their trailing newline so callers can ''.join() the result
+        for line in io.StringIO(diff):
+            color = HEADERS.get(line[:3]) or SIGNS.get(line[:1])
+            if not color:
+                yield line
+            elif line.endswith('\n'):
+                yield color + line[:-1] + RESET + '\n'
+            else:
+                yield color + line + RESET
+else:
+    # Every color is '' without colorama, so hand back the diff untouched
+    def color_diff(diff):
+        return [diff]
+
+
+def _json_key(key):
+    # Mirror how json.dumps turns non-string dict keys into strings
+    if isinstance(key, string_types):
+        return key
+    if key is True:
+        return "true"
+    if key is False:
+        return "false"
+    if key is None:
+        return "null"
+    if isinstance(key, float):
+        return repr(key)
+    return str(key)
+
+
+def _to_plain(obj):
+    # Copy learned data into plain dicts/lists the same way a JSON round-trip
+    # would, so it compares cleanly against data that came back from Ansible.
+    if isinstance(obj, dict):
+        return {_json_key(k): _to_plain(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_to_plain(v) for v in obj]
+    return obj
+
+
+def _prune_equal(before, current):
+    # Drop every subtree that is identical on both sides. Genie's Diff only
+    # reports differences, so its output is unchanged, but it no longer has
+    # to walk the (usually huge) unchanged part of the feature tree.
+    if not isinstance(before, dict) or not isinstance(current, dict):
+        return before, current
+    pruned_before = {}
+    pruned_current = {}
+    for k in before.keys() | current.keys():
+        if k not in current:
+            pruned_before[k] = before[k]
+        elif k not in before:
+            pruned_current[k] = current[k]
+        elif before[k] != current[k]:
+            pruned_before[k], pruned_current[k] = _prune_equal(before[k], current[k])
+    return pruned_before, pruned_current
+
+
+@functools.lru_cache(maxsize=1)
+def _ops_json_path():
+    genie_ops = importlib.util.find_spec("genie.libs.ops")
+    return Path(genie_ops.origin).parent.joinpath("ops.json")
+
+
+# Errors that mean a cached pickle is missing, partial, or from something else
+_PICKLE_LOAD_ERRORS = (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError)
+
+
+def _current_umask():
+    # os.umask can only be read by setting it, so put it straight back
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def _write_pickle(path, obj):
+    # Several Ansible forks may write at once, so write to a temp file in the
+    # same directory and atomically swap it in. Readers never see a partial file.
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=path.name, suffix=".tmp")
+    try:
+        # mkstemp creates the file 0600; give it normal package file permissions
+        # so other users running the module can still read the cache
+        os.fchmod(fd, 0o644 & ~_current_umask())
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, str(path))
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# Parsed ops.json keyed by (path, mtime) so repeat calls skip the disk read
+_OPS_JSON_CACHE = {}
+
+
+def _load_ops_json(path):
+    path = Path(path)
+    mtime = path.stat().st_mtime_ns
+    key = (str(path), mtime)
+    if key in _OPS_JSON_CACHE:
+        return _OPS_JSON_CACHE[key]
+
+    # Ansible runs each task in a fresh interpreter, so also keep a pickled
+    # copy next to ops.json. It is only trusted if it was built from the same mtime.
+    pickle_path = path.with_name(path.name + ".pkl")
+    ops_json = None
+    try:
+        with open(pickle_path, "rb") as f:
+            cached_mtime, cached_ops = pickle.load(f)
+        if cached_mtime == mtime:
+            ops_json = cached_ops
+    except _PICKLE_LOAD_ERRORS:
+        pass
+
+    if ops_json is None:
+        with open(path, "rb") as f:
+            ops_json = _json_loads(f.read())
+        try:
+            _write_pickle(pickle_path, (mtime, ops_json))
+        except OSError:
+            # Genie may be installed somewhere we can't write to
+            pass
+
+    _OPS_JSON_CACHE[key] = ops_json
+    return ops_json
+
+
+def _get_feature_excludes(feature):
+    # Only import the ops module for the feature being diffed; importing every
+    # genie.libs.ops module up front is by far the slowest part of a run.
+    package_name = feature.capitalize()
+    try:
+        this_module = import_module("genie.libs.ops.{}.{}".format(feature, feature))
+        return getattr(getattr(this_module, package_name), "exclude", [])
+    except (ImportError, AttributeError):
+        return []
+
+
+def _load_default_excludes(ops_file, supported_features, features):
+    # The exclude lists are static for a given Genie/genie.libs.ops release, so
+    # build them once and keep them next to ops.json. The cache is tagged with
+    # the Genie version and the ops.json mtime, which changes whenever
+    # genie.libs.ops is upgraded on its own.
+    try:
+        import genie
+        genie_version = getattr(genie, "__version__", None)
+    except ImportError:
+        genie_version = None
+    ops_file = Path(ops_file)
+    tag = (genie_version, ops_file.stat().st_mtime_ns)
+
+    cache_path = ops_file.with_name("ops_excludes.pkl")
+    try:
+        with open(cache_path, "rb") as f:
+            cached_tag, cached_excludes = pickle.load(f)
+        if cached_tag == tag:
+            return cached_excludes
+    except _PICKLE_LOAD_ERRORS:
+        pass
+
+    # Building the full table imports every genie.libs.ops module. Only do
+    # that when the result can be saved, otherwise just import what's needed.
+    if not os.access(str(ops_file.parent), os.W_OK):
+        return {i: _get_feature_excludes(i) for i in features}
+
+    default_excludes = {}
+    for i in supported_features:
+        default_excludes.update({i: _get_feature_excludes(i)})
+
+    try:
+        _write_pickle(cache_path, (tag, default_excludes))
+    except OSError:
+        pass
+
+    return default_excludes
+
 
+_PYATS_LOGGERS = ("unicon", "genie", "pyats")
 
-def color_diff(diff):
-    diff_list = diff.splitlines()
-    for line in diff_list:
-        if line.startswith('+++'):
-            yield Fore.WHITE + line + Fore.RESET
-        elif line.startswith('---'):
-            yield Fore.WHITE + line + Fore.RESET
-        elif line.startswith('+'):
-            yield Fore.GREEN + line + Fore.RESET
-        elif line.startswith('-'):
-            yield Fore.RED + line + Fore.RESET
-        elif line.startswith('@@'):
-            yield Fore.BLUE + line + Fore.RESET
-        else:
-            yield line
+
+@contextlib.contextmanager
+def _quiet_logging():
+    # pyATS/Genie log the whole CLI stream, which is a lot of per-line
+    # formatting on large show outputs. Only let warnings through meanwhile.
+    saved = [(n, logging.getLogger(n).level) for n in _PYATS_LOGGERS]
+    for n in _PYATS_LOGGERS:
+        logging.getLogger(n).setLevel(logging.WARNING)
+    try:
+        yield
+    finally:
+        for n, level in saved:
+            logging.getLogger(n).setLevel(level)
 
 
 def run_module():
@@ -144,7 +363,7 @@ def run_module():
         username=dict(type="str", required=True),
         password=dict(type="str", required=True, no_log=True),
         os=dict(type="str", required=True),
-        feature=dict(type="str", required=True),
+        feature=dict(type="raw", required=True),
         compare_to=dict(type="raw", required=False),
         exclude=dict(type="list", required=False),
         no_default_exclusion=dict(type="bool", required=False),
@@ -165,36 +384,21 @@ def run_module():
     # supports check mode
     module = AnsibleModule(argument_spec=module_args, supports_check_mode=True)
 
-    host = module.params["host"]
-    if module.params.get("port") is not None:
-        port = module.params["port"]
-    else:
+    p = module.params
+    host = p["host"]
+    port = p.get("port")
+    if port is None:
         port = 22
-    username = module.params["username"]
-    password = module.params["password"]
-    os = module.params["os"]
-    feature = module.params["feature"]
-    if module.params.get("compare_to"):
-        # compare_to = json.loads(module.params.get("compare_to"))
-        compare_to = module.params.get("compare_to")
-    if module.params.get("exclude"):
-        excluded_keys = module.params.get("exclude")
-    if module.params.get("no_default_exclusion") is False:
-        no_default_exclusion = False
-    elif module.params.get("no_default_exclusion") is None:
-        no_default_exclusion = False
-    else:
-        no_default_exclusion = True
-    if module.params.get("colors") is False:
-        colors = False
-    elif module.params.get("colors") is not None:
-        colors = True
-    else:
-        colors = True
-    if module.params.get("protocol") == "telnet":
-        protocol = "telnet"
-    else:
-        protocol = "ssh"
+    username = p["username"]
+    password = p["password"]
+    device_os = p["os"]
+    feature = p["feature"]
+    compare_to = p.get("compare_to")
+    excluded_keys = p.get("exclude") or []
+    no_default_exclusion = bool(p.get("no_default_exclusion"))
+    # colors defaults to on unless explicitly turned off
+    colors = p.get("colors") is not False
+    protocol = "telnet" if p.get("protocol") == "telnet" else "ssh"
 
     # if the user is working with this module in only check mode we do not
     # want to make any changes to the environment, just return the current
@@ -203,80 +407,63 @@ def run_module():
         module.exit_json(**result)
 
     # Check user input
-    for k, v in module.params.items():
-        if k == "port" and v is not None:
-            if not isinstance(v, int) and v not in range(1-65535):
-                raise AnsibleError(
-                    "The {} parameter must be an integer between 0-65535".format(k)
-                )
-        elif k == "compare_to":
-            pass
-        elif k == "port":
-            pass
-        elif k == "exclude":
-            pass
-        elif k == "colors":
-            pass
-        elif k == "no_default_exclusion":
-            pass
-        elif k == "protocol":
-            pass
-        else:
-            if not isinstance(v, string_types):
-                raise AnsibleError(
-                    "The {} parameter must be a string such as a hostname or IP address.".format(
-                        k
-                    )
+    if not isinstance(port, int) or not 0 < port < 65536:
+        raise AnsibleError(
+            "The port parameter must be an integer between 1-65535"
+        )
+    for k in ("host", "username", "password", "os"):
+        if not isinstance(p[k], string_types):
+            raise AnsibleError(
+                "The {} parameter must be a string such as a hostname or IP address.".format(
+                    k
                 )
+            )
+    features = [feature] if isinstance(feature, string_types) else feature
+    if not isinstance(features, list) or not features or \
+            not all(isinstance(f, string_types) for f in features):
+        raise AnsibleError(
+            "The feature parameter must be a string or a list of strings."
+        )
+    features = list(dict.fromkeys(features))
 
     # Did the user pass in a feature that is supported on a given platform
-    genie_ops = importlib.util.find_spec("genie.libs.ops")
-    ops_file_obj = Path(genie_ops.origin).parent.joinpath("ops.json")
-    with open(ops_file_obj, "r") as f:
-        ops_json = json.load(f)
-    supported_features = [k for k, _ in ops_json.items()]
+    ops_file_obj = _ops_json_path()
+    ops_json = _load_ops_json(ops_file_obj)
 
     # Load in default exclusions for diffs for all features for genie learn
     # genie_yamls = importlib.util.find_spec("genie.libs.sdk.genie_yamls")
     # genie_excludes = Path(genie_yamls.origin).parent.joinpath("pts_datafile.yaml")
     # with open(genie_excludes, "r") as f:
     #     diff_excludes = json.load(f)
-    # supported_features = [k for k, _ in ops_json.items()]
+    # supported_features = list(ops_json)
+
+    for feature in features:
+        # Is the feature even supported?
+        if feature not in ops_json:
+            raise AnsibleError(
+                "The feature entered is not supported on the current version of Genie.\nCurrently supported features: {0}\n{1}".format(
+                    to_native(list(ops_json)),
+                    "https://pubhub.devnetcloud.com/media/genie-feature-browser/docs/#/models",
+                )
+            )
 
-    default_excludes = {}
-    from importlib import import_module
-    for i in supported_features:
-        modulename = "genie.libs.ops.{}.{}".format(i, i)
-        package_name = i.capitalize()
-        try:
-            this_module = import_module(modulename, package_name)
-            this_class = getattr(this_module, package_name)
-            this_excludes = this_class.exclude
-            default_excludes.update({i: this_excludes})
-        except AttributeError:
-            default_excludes.update({i: []})
-
-        # this_module = __import__(modulename)
-        # default_excludes.append({i: this_module.i)
-        # from genie.libs.ops.i.i import Interface
-
-    # Is the feature even supported?
-    if feature not in supported_features:
-        raise AnsibleError(
-            "The feature entered is not supported on the current version of Genie.\nCurrently supported features: {0}\n{1}".format(
-                to_native(supported_features),
-                "https://pubhub.devnetcloud.com/media/genie-feature-browser/docs/#/models",
+        # Is the feature supported on the OS that was provided from the user?
+        os_support = ops_json[feature]
+        if device_os not in os_support:
+            raise AnsibleError(
+                "The {0} feature entered is not supported on {1}.\nCurrently supported features & platforms:\n{2}".format(
+                    feature, device_os,
+                    "https://pubhub.devnetcloud.com/media/genie-feature-browser/docs/#/models",
+                )
             )
-        )
 
-    # Is the feature supported on the OS that was provided from the user?
-    for f in ops_json.items():
-        if feature == f[0]:
-            if os not in [k for k, _ in f[1].items()]:
+        # Was this feature learned in the run we are comparing against?
+        if compare_to:
+            prior = compare_to.get("genie") if isinstance(compare_to, dict) else None
+            if not isinstance(prior, dict) or feature not in prior:
                 raise AnsibleError(
-                    "The {0} feature entered is not supported on {1}.\nCurrently supported features & platforms:\n{2}".format(
-                        feature, os,
-                        "https://pubhub.devnetcloud.com/media/genie-feature-browser/docs/#/models",
+                    "The compare_to data does not contain learned data for the {0} feature.".format(
+                        feature
                     )
                 )
 
@@ -288,18 +475,28 @@ def run_module():
                 "protocol": protocol,
                 "username": username,
                 "password": password,
-                "os": os,
+                "os": device_os,
             }
         }
     }
 
-    tb = load(testbed)
-    dev = tb.devices[host]
-    dev.connect(log_stdout=False, learn_hostname=True)
-    output = dev.learn(feature)
+    with _quiet_logging():
+        tb = load(testbed)
+        dev = tb.devices[host]
+        dev.connect(log_stdout=False, learn_hostname=True)
+        try:
+            # One CLI session can't be driven from several threads, so learn
+            # the features one after another over the same connection
+            outputs = {feature: dev.learn(feature) for feature in features}
+        finally:
+            # Close the session here, before exit_json writes the result
+            try:
+                dev.disconnect()
+            except Exception:
+                pass
 
     # Do diff if compare_to was provided
-    if module.params.get("compare_to"):
+    if compare_to:
         # do genie diff
         # print(type(compare_to['genie'][feature]))
         # print(type(output.info))
@@ -309,36 +506,40 @@ def run_module():
         # with open('/tmp/output.txt', 'w') as f:
         #     f.write(json.dumps(output.info))
 
-        before = compare_to['genie'][feature]
-        current = json.dumps(output.info)
-        current = json.loads(current)
-        # current = eval(str(output.info))
-        try:
-            excluded_keys
+        if not no_default_exclusion:
+            default_excludes = _load_default_excludes(ops_file_obj, ops_json, features)
+        diffs = []
+        for feature, output in outputs.items():
+            before = compare_to['genie'][feature]
+            current = _to_plain(output.info)
+            # current = eval(str(output.info))
+            if before == current:
+                # Nothing changed, no need to build and render a Diff
+                continue
+            before, current = _prune_equal(before, current)
             if no_default_exclusion:
                 merged_exclusions = excluded_keys
             else:
-                merged_exclusions = list(set().union(excluded_keys, default_excludes[feature]))
-            dd = Diff(before, current, exclude=merged_exclusions)
-        except NameError:
-            if len(default_excludes[feature]) > 0:
-                if no_default_exclusion:
-                    dd = Diff(before, current)
-                else:
-                    dd = Diff(before, current, exclude=default_excludes[feature])
+                merged_exclusions = list(set(excluded_keys).union(default_excludes.get(feature, [])))
+            if merged_exclusions:
+                dd = Diff(before, current, exclude=merged_exclusions)
             else:
                 dd = Diff(before, current)
-        dd.findDiff()
-        if colors:
-            result.update({"diff": {"prepared": '\n'.join(color_diff(str(dd)))}})
-        else:
-            result.update({"diff": {"prepared": str(dd)}})
+            dd.findDiff()
+            diff_str = str(dd)
+            if diff_str:
+                if len(outputs) > 1:
+                    # Say which feature each diff belongs to
+                    diffs.append("{}:".format(feature))
+                diffs.append(diff_str)
+        diff_str = '\n'.join(diffs)
+        prepared = ''.join(color_diff(diff_str)) if colors else diff_str
+        result.update({"diff": {"prepared": prepared}})
         module._diff = True
-        if len(str(dd)) > 0:
-            result['changed'] = True
+        result['changed'] = bool(diff_str)
 
     feature_data = {
-        feature: output.info
+        feature: output.info for feature, output in outputs.items()
     }
 
     result.update({"genie": feature_data})